@@ -3,9 +3,15 @@ Inits the summary bot. It starts a Reddit instance using PRAW, gets the latest p
 and filters those who have already been processed.
 """
 
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import urlsplit
+
 import praw
 import requests
 import tldextract
+from requests.adapters import HTTPAdapter
 
 import cloud
 import config
@@ -16,49 +22,192 @@ import summary
 MINIMUM_REDUCTION_THRESHOLD = 20
 MAXIMUM_REDUCTION_THRESHOLD = 68
 
+# The number of articles downloaded at the same time.
+MAX_WORKERS = 8
+
+# The number of submissions requested from each subreddit, they fit in a single listing page.
+NEW_POSTS_LIMIT = 50
+
+# The number of newest seen posts we keep for each subreddit, they are used to request only the new ones.
+SEEN_POSTS_LIMIT = 5
+
 # File locations
 POSTS_LOG = "./processed_posts.txt"
+NEWEST_POSTS_LOG = "./newest_posts.txt"
 WHITELIST_FILE = "./assets/whitelist.txt"
 ERROR_LOG = "./error.log"
 
 # Templates.
-TEMPLATE = open("./templates/es.txt", "r", encoding="utf-8").read()
+TEMPLATE = Path("./templates/es.txt").read_text(encoding="utf-8")
 
 
 HEADERS = {"User-Agent": "Summarizer v2.0"}
 
+# A single session keeps the connections alive for the websites we visit more than once.
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("http://", HTTPAdapter(pool_connections=32, pool_maxsize=64))
+SESSION.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=64))
+
+# The log files are opened by open_logs() when init() starts and closed when it ends.
+posts_log_file = None
+error_log_file = None
+
 
 def load_whitelist():
-    """Reads the processed posts log file and creates it if it doesn't exist.
+    """Reads the whitelist file.
 
     Returns
     -------
-    list
-        A list of domains that are confirmed to have an 'article' tag.
+    frozenset
+        A set of domains that are confirmed to have an 'article' tag.
 
     """
 
-    with open(WHITELIST_FILE, "r", encoding="utf-8") as log_file:
-        return log_file.read().splitlines()
+    return frozenset(Path(WHITELIST_FILE).read_text(encoding="utf-8").splitlines())
 
 
 def load_log():
-    """Reads the processed posts log file and creates it if it doesn't exist.
+    """Reads the processed posts log file, it is created by open_logs().
 
     Returns
     -------
-    list
-        A list of Reddit posts ids.
+    set
+        A set of Reddit posts ids, stored as ASCII bytes.
 
     """
 
-    try:
-        with open(POSTS_LOG, "r", encoding="utf-8") as log_file:
-            return log_file.read().splitlines()
+    # The ids are short ASCII strings, bytes are cheaper to store and split.
+    return set(Path(POSTS_LOG).read_bytes().split())
+
+
+def load_newest_posts():
+    """Reads the newest seen posts of each subreddit.
+
+    Returns
+    -------
+    dict
+        A dict with the subreddit names as keys and lists of the newest seen post ids as values.
+
+    """
 
+    newest_posts = dict()
+
+    try:
+        lines = Path(NEWEST_POSTS_LOG).read_text(encoding="utf-8").splitlines()
     except FileNotFoundError:
-        with open(POSTS_LOG, "a", encoding="utf-8") as log_file:
-            return []
+        return newest_posts
+
+    for line in lines:
+
+        # Each line has the subreddit name followed by its post ids, we skip malformed lines.
+        fields = line.split()
+
+        if len(fields) >= 2:
+            newest_posts[fields[0]] = fields[1:]
+
+    return newest_posts
+
+
+def update_newest_posts(newest_posts):
+    """Overwrites the newest posts log with the given subreddits and post ids.
+
+    Parameters
+    ----------
+    newest_posts : dict
+        A dict with the subreddit names as keys and lists of the newest seen post ids as values.
+
+    """
+
+    with open(NEWEST_POSTS_LOG, "w", encoding="utf-8") as log_file:
+        for subreddit, post_ids in newest_posts.items():
+            log_file.write("{} {}\n".format(subreddit, " ".join(post_ids)))
+
+
+def get_new_submissions(reddit, subreddit, seen_posts):
+    """Gets the newest submissions of a subreddit.
+
+    We ask Reddit for the posts newer than the oldest one we have seen. The newer seen posts
+    come back in the same page, so a single request is enough even when nothing new was posted.
+
+    Parameters
+    ----------
+    reddit : praw.Reddit
+        The Reddit instance.
+
+    subreddit : str
+        The subreddit name.
+
+    seen_posts : list
+        The ids of the newest posts seen in a previous run, sorted from newest to oldest.
+
+    Returns
+    -------
+    tuple
+        The submissions sorted from newest to oldest and the updated list of seen post ids.
+
+    """
+
+    # PRAW's listing generator may request a second page, we only need the first one.
+    path = "r/{}/new".format(subreddit)
+
+    # We only try the next newer post when the older one came back empty.
+    for post_id in reversed(seen_posts):
+
+        params = {"limit": NEW_POSTS_LIMIT, "before": "t3_{}".format(post_id)}
+        submissions = list(reddit.get(path, params=params))
+
+        # The page doesn't include the post we asked for, we keep it as it is still listed.
+        if submissions:
+            return submissions, ([submission.id for submission in submissions] + [post_id])[:SEEN_POSTS_LIMIT]
+
+    # Every page was empty. Either nothing new was posted after our newest post or it was removed.
+    # In the latter case Reddit returns empty pages forever, so we fall back to the latest posts.
+    if seen_posts and is_listed(reddit, seen_posts[0]):
+        return list(), seen_posts[:1]
+
+    submissions = list(reddit.get(path, params={"limit": NEW_POSTS_LIMIT}))
+
+    return submissions, [submission.id for submission in submissions[:SEEN_POSTS_LIMIT]]
+
+
+def is_listed(reddit, post_id):
+    """Checks if the given post still exists and wasn't removed from the subreddit listings.
+
+    Parameters
+    ----------
+    reddit : praw.Reddit
+        The Reddit instance.
+
+    post_id : str
+        A Reddit post id.
+
+    Returns
+    -------
+    bool
+        True if the post is still listed.
+
+    """
+
+    submission = next(reddit.info(fullnames=["t3_{}".format(post_id)]), None)
+
+    return submission is not None and getattr(submission, "removed_by_category", None) is None
+
+
+def open_logs():
+    """Opens the processed posts and error logs in line buffered append mode."""
+
+    global posts_log_file, error_log_file
+
+    posts_log_file = open(POSTS_LOG, "a", encoding="utf-8", buffering=1)
+    error_log_file = open(ERROR_LOG, "a", encoding="utf-8", buffering=1)
+
+
+def close_logs():
+    """Closes the processed posts and error logs."""
+
+    posts_log_file.close()
+    error_log_file.close()
 
 
 def update_log(post_id):
@@ -71,8 +220,7 @@ def update_log(post_id):
 
     """
 
-    with open(POSTS_LOG, "a", encoding="utf-8") as log_file:
-        log_file.write("{}\n".format(post_id))
+    posts_log_file.write("{}\n".format(post_id))
 
 
 def log_error(error_message):
@@ -85,8 +233,71 @@ def log_error(error_message):
 
     """
 
-    with open(ERROR_LOG, "a", encoding="utf-8") as log_file:
-        log_file.write("{}\n".format(error_message))
+    error_log_file.write("{}\n".format(error_message))
+
+
+@lru_cache(maxsize=1024)
+def get_domain(hostname):
+    """Extracts the registered domain from the given hostname.
+
+    The results are cached, many submissions link to the same websites.
+
+    Parameters
+    ----------
+    hostname : str
+        The hostname of the article url, e.g. 'www.example.com'.
+
+    Returns
+    -------
+    str
+        The domain and suffix of the url, e.g. 'example.com'.
+
+    """
+
+    ext = tldextract.extract(hostname)
+    return "{}.{}".format(ext.domain, ext.suffix)
+
+
+def fetch_article(url):
+    """Downloads the article and scrapes its title, date and body.
+
+    Parameters
+    ----------
+    url : str
+        The url of the article.
+
+    Returns
+    -------
+    tuple
+        The article title, date and body.
+
+    """
+
+    with SESSION.get(url, timeout=10) as response:
+
+        # The raw bytes are decoded by the parser, this saves a full decoding pass.
+        html_source = response.content
+
+        # The charset is declared at the top of the document, we only check the first bytes.
+        html_head = html_source[:2048].lower()
+
+        # Most of the times the encoding is utf-8 but in edge cases
+        # we set it to ISO-8859-1 when it is present in the HTML header.
+        if b"iso-8859-1" in html_head:
+            encoding = "iso-8859-1"
+
+        # Without a charset in the Content-Type header Requests reports ISO-8859-1.
+        # If the page declares its own charset we let the parser read it.
+        elif "charset=" not in response.headers.get("Content-Type", "").lower():
+            encoding = None if b"charset" in html_head else "utf-8"
+
+        elif response.encoding == "ISO-8859-1":
+            encoding = "utf-8"
+
+        else:
+            encoding = response.encoding
+
+    return scraper.scrape_html(html_source, encoding)
 
 
 def init():
@@ -96,68 +307,92 @@ def init():
                          user_agent=config.USER_AGENT, username=config.REDDIT_USERNAME,
                          password=config.REDDIT_PASSWORD)
 
-    processed_posts = load_log()
-    whitelist = load_whitelist()
+    # The logs are opened first, this also creates them if they don't exist.
+    open_logs()
+
+    try:
+        processed_posts = load_log()
+        newest_posts = load_newest_posts()
+        whitelist = load_whitelist()
+
+        for subreddit in config.SUBREDDITS:
+
+            # We only ask Reddit for the submissions newer than the ones we have seen.
+            submissions, seen_posts = get_new_submissions(reddit, subreddit, newest_posts.get(subreddit, list()))
+
+            # We first collect the whitelisted submissions that haven't been processed.
+            candidates = list()
+
+            for submission in submissions:
+
+                if submission.id.encode("ascii") not in processed_posts:
 
-    for subreddit in config.SUBREDDITS:
+                    clean_url = submission.url.replace("amp.", "")
 
-        for submission in reddit.subreddit(subreddit).new(limit=50):
+                    if get_domain(urlsplit(clean_url).netloc) in whitelist:
+                        candidates.append((submission, clean_url))
 
-            if submission.id not in processed_posts:
+            # The articles are downloaded in parallel, PRAW and the logs are only used from this thread.
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                futures = [executor.submit(fetch_article, clean_url)
+                           for submission, clean_url in candidates]
 
-                clean_url = submission.url.replace("amp.", "")
-                ext = tldextract.extract(clean_url)
-                domain = "{}.{}".format(ext.domain, ext.suffix)
+            articles = list()
 
-                if domain in whitelist:
+            for (submission, clean_url), future in zip(candidates, futures):
 
-                    try:
-                        with requests.get(clean_url, headers=HEADERS, timeout=10) as response:
+                try:
+                    article_title, article_date, article_body = future.result()
+                    articles.append((submission, clean_url, article_title, article_date, article_body))
+                except Exception as e:
+                    log_error("{},{}".format(clean_url, e))
+                    update_log(submission.id)
+                    print("Failed:", submission.id)
 
-                            # Most of the times the encoding is utf-8 but in edge cases
-                            # we set it to ISO-8859-1 when it is present in the HTML header.
-                            if "iso-8859-1" in response.text.lower():
-                                response.encoding = "iso-8859-1"
-                            elif response.encoding == "ISO-8859-1":
-                                response.encoding = "utf-8"
+            # spaCy processes all the articles in a single batch, it is faster that way.
+            docs = summary.tokenize_articles([article_body for *_, article_body in articles])
 
-                            html_source = response.text
+            for (submission, clean_url, article_title, article_date, article_body), (cleaned_article, doc) in zip(articles, docs):
 
-                        article_title, article_date, article_body = scraper.scrape_html(
-                            html_source)
+                try:
+                    summary_dict = summary.summarize_doc(cleaned_article, doc)
+                except Exception as e:
+                    log_error("{},{}".format(clean_url, e))
+                    update_log(submission.id)
+                    print("Failed:", submission.id)
+                    continue
 
-                        summary_dict = summary.get_summary(article_body)
-                    except Exception as e:
-                        log_error("{},{}".format(clean_url, e))
-                        update_log(submission.id)
-                        print("Failed:", submission.id)
-                        continue
+                # To reduce low quality submissions, we only process those that made a meaningful summary.
+                if summary_dict["reduction"] >= MINIMUM_REDUCTION_THRESHOLD and summary_dict["reduction"] <= MAXIMUM_REDUCTION_THRESHOLD:
 
-                    # To reduce low quality submissions, we only process those that made a meaningful summary.
-                    if summary_dict["reduction"] >= MINIMUM_REDUCTION_THRESHOLD and summary_dict["reduction"] <= MAXIMUM_REDUCTION_THRESHOLD:
+                    # Create a wordcloud, upload it to Imgur and get back the url.
+                    image_url = cloud.generate_word_cloud(
+                        summary_dict["article_words"])
 
-                        # Create a wordcloud, upload it to Imgur and get back the url.
-                        image_url = cloud.generate_word_cloud(
-                            summary_dict["article_words"])
+                    # We start creating the comment body.
+                    post_body = "\n\n".join(
+                        ["> " + item for item in summary_dict["top_sentences"]])
 
-                        # We start creating the comment body.
-                        post_body = "\n\n".join(
-                            ["> " + item for item in summary_dict["top_sentences"]])
+                    top_words = "".join(["{}^#{} ".format(word, index+1)
+                                         for index, word in enumerate(summary_dict["top_words"])])
 
-                        top_words = ""
+                    post_message = TEMPLATE.format(
+                        article_title, clean_url, summary_dict["reduction"], article_date, post_body, image_url, top_words)
 
-                        for index, word in enumerate(summary_dict["top_words"]):
-                            top_words += "{}^#{} ".format(word, index+1)
+                    submission.reply(post_message)
+                    update_log(submission.id)
+                    print("Replied to:", submission.id)
+                else:
+                    update_log(submission.id)
+                    print("Skipped:", submission.id)
 
-                        post_message = TEMPLATE.format(
-                            article_title, clean_url, summary_dict["reduction"], article_date, post_body, image_url, top_words)
+            # We save them once all the candidates were processed, otherwise a crash would skip them.
+            if seen_posts != newest_posts.get(subreddit):
+                newest_posts[subreddit] = seen_posts
+                update_newest_posts(newest_posts)
 
-                        reddit.submission(submission.id).reply(post_message)
-                        update_log(submission.id)
-                        print("Replied to:", submission.id)
-                    else:
-                        update_log(submission.id)
-                        print("Skipped:", submission.id)
+    finally:
+        close_logs()
 
 
 if __name__ == "__main__":
@@ -2,7 +2,7 @@
 This script generates a word cloud from the article words. Uploads it to Imgur and returns back the url.
 """
 
-import os
+import io
 import random
 
 import numpy as np
@@ -14,12 +14,24 @@ import config
 
 MASK_FILE = "./assets/cloud.png"
 FONT_FILE = "./assets/sofiapro-light.otf"
-IMAGE_PATH = "./temp.png"
 
 COLORMAPS = ["spring", "summer", "autumn", "Wistia"]
 
 mask = np.array(Image.open(MASK_FILE))
 
+# One configured WordCloud per colormap, they are reused for every article.
+word_clouds = {colormap: wordcloud.WordCloud(background_color="#222222",
+                                             max_words=2000,
+                                             mask=mask,
+                                             contour_width=2,
+                                             colormap=colormap,
+                                             font_path=FONT_FILE,
+                                             contour_color="white")
+               for colormap in COLORMAPS}
+
+# The Imgur connection is kept alive between uploads.
+SESSION = requests.Session()
+
 
 def generate_word_cloud(text):
     """Generates a word cloud and uploads it to Imgur.
@@ -35,29 +47,25 @@ def generate_word_cloud(text):
         The url generated from the Imgur API.
     """
 
-    wc = wordcloud.WordCloud(background_color="#222222",
-                             max_words=2000,
-                             mask=mask,
-                             contour_width=2,
-                             colormap=random.choice(COLORMAPS),
-                             font_path=FONT_FILE,
-                             contour_color="white")
+    wc = word_clouds[random.choice(COLORMAPS)]
 
     wc.generate(text)
-    wc.to_file(IMAGE_PATH)
-    image_link = upload_image(IMAGE_PATH)
-    os.remove(IMAGE_PATH)
 
-    return image_link
+    # The image is kept in memory instead of a temporary file.
+    image_file = io.BytesIO()
+    wc.to_image().save(image_file, format="PNG")
+    image_file.seek(0)
+
+    return upload_image(image_file)
 
 
-def upload_image(image_path):
+def upload_image(image_file):
     """Uploads an image to Imgur and returns the permanent link url.
 
     Parameters
     ----------
-    image_path : str
-        The path of the file to be uploaded.
+    image_file : file-like object
+        The PNG image to be uploaded.
 
     Returns
     -------
@@ -67,9 +75,9 @@ def upload_image(image_path):
 
     url = "https://api.imgur.com/3/image"
     headers = {"Authorization": "Client-ID " + config.IMGUR_CLIENT_ID}
-    files = {"image": open(IMAGE_PATH, "rb")}
+    files = {"image": image_file}
 
-    with requests.post(url, headers=headers, files=files) as response:
+    with SESSION.post(url, headers=headers, files=files) as response:
 
         # We extract the new link from the response.
         image_link = response.json()["data"]["link"]
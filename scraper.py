@@ -2,136 +2,189 @@
 This function tries to extract the article title, date and body from an HTML string.
 """
 
+import re
 from datetime import datetime
 
-from bs4 import BeautifulSoup
+import lxml.etree
+import lxml.html
 
 # We don't process articles that have fewer characters than this.
 ARTICLE_MINIMUM_LENGTH = 650
 
+# Allows the XPath expressions to use the EXSLT regular expression functions.
+REGEXP_NAMESPACES = {"re": "http://exslt.org/regular-expressions"}
+
+# These tags add noise to the article text.
+NOISY_TAGS = ["script", "img", "ol", "ul", "time", "h1", "h2", "h3", "iframe", "style", "form", "footer", "figcaption"]
+
+# These class names/ids are known to add noise or duplicate text to the article.
+NOISY_NAMES = ["image", "img", "video", "subheadline", "editor", "fondea", "resumen", "tags", "sidebar", "comment",
+               "entry-title", "breaking_content", "pie", "tract", "caption", "tweet", "expert", "previous", "next",
+               "compartir", "rightbar", "mas", "copyright", "instagram-media", "cookie", "paywall", "mainlist", "sitelist"]
+
+# These names commonly hold the article text.
+COMMON_NAMES = ["artic", "summary", "cont", "note", "cuerpo", "body"]
 
-def scrape_html(html_source):
-    """Tries to scrape the article from the given HTML source.
+
+def build_name_condition(attribute, names):
+    """Builds an XPath condition that matches when the attribute contains any of the names.
+
+    All the names are joined into a single case insensitive regex, this is a lot faster
+    than testing each name with contains().
 
     Parameters
     ----------
-    html_source : str
-        The html source of the article.
+    attribute : str
+        The attribute to test, usually 'id' or 'class'.
+
+    names : list
+        The substrings to look for, the match ignores case.
 
     Returns
     -------
-    tuple
-        The article title, date and body.
+    str
+        An XPath condition to be used inside a predicate.
 
     """
 
-    # Very often the text between tags comes together, we add an artificial newline to each common tag.
-    for item in ["</p>", "</blockquote>", "</div>", "</h3>", "<br>"]:
-        html_source = html_source.replace(item, item+"\n")
+    pattern = "|".join([re.escape(name) for name in names])
 
-    # We create a BeautifulSOup object and remove the unnecessary tags.
-    soup = BeautifulSoup(html_source, "html5lib")
+    return "@{0} and re:test(@{0}, '{1}', 'i')".format(attribute, pattern)
 
-    # Then we extract the title and the article tags.
-    article_title = soup.find("title").text.replace("\n", " ").strip()
 
-    # If our title is too short we fallback to the first h1 tag.
-    if len(article_title) <= 5:
-        article_title = soup.find("h1").text.replace("\n", " ").strip()
+# The XPath expressions are compiled once at import time.
+META_TIME_XPATH = lxml.etree.XPath("(descendant::meta[contains(@property, 'time')]/@content)[1]")
 
-    article_date = ""
+# The noisy tags and the tags with noisy names are collected in a single pass over the tree.
+NOISY_XPATH = lxml.etree.XPath("descendant::*[{}] | descendant::div[{}] | descendant::*[self::div or self::p or self::blockquote][{}]".format(
+    " or ".join(["self::" + tag for tag in NOISY_TAGS]),
+    build_name_condition("id", NOISY_NAMES), build_name_condition("class", NOISY_NAMES)),
+    namespaces=REGEXP_NAMESPACES)
 
-    # We look for the first meta tag that has the word 'time' in it.
-    for item in soup.find_all("meta"):
+COMMON_ID_XPATH = lxml.etree.XPath("descendant::*[self::div or self::section][{}]".format(
+    build_name_condition("id", COMMON_NAMES)), namespaces=REGEXP_NAMESPACES)
 
-        if "time" in item.get("property", ""):
+COMMON_CLASS_XPATH = lxml.etree.XPath("descendant::*[self::div or self::section][{}]".format(
+    build_name_condition("class", COMMON_NAMES)), namespaces=REGEXP_NAMESPACES)
 
-            clean_date = item["content"].split("+")[0].replace("Z", "")
-            
-            # Use your preferred time formatting.
-            article_date = "{:%d-%m-%Y a las %H:%M:%S}".format(
-                datetime.fromisoformat(clean_date))
-            break
 
-    # If we didn't find any meta tag with a datetime we look for a 'time' tag.
-    if len(article_date) <= 5:
+def get_parser(encoding):
+    """Creates an HTML parser for the given encoding.
+
+    Parameters
+    ----------
+    encoding : str
+        The encoding name, usually taken from the HTTP headers.
+
+    Returns
+    -------
+    lxml.html.HTMLParser
+        A parser for the given encoding. When the name is missing or libxml2 doesn't
+        know it, the parser reads the charset declared in the document.
+
+    """
+
+    if encoding:
         try:
-            article_date = soup.find("time").text.strip()
-        except:
+            return lxml.html.HTMLParser(encoding=encoding)
+        except LookupError:
             pass
 
-    # We remove some tags that add noise.
-    [tag.extract() for tag in soup.find_all(
-        ["script", "img", "ol", "ul", "time", "h1", "h2", "h3", "iframe", "style", "form", "footer", "figcaption"])]
+    return lxml.html.HTMLParser()
 
-    # These class names/ids are known to add noise or duplicate text to the article.
-    noisy_names = ["image", "img", "video", "subheadline", "editor", "fondea", "resumen", "tags", "sidebar", "comment",
-                   "entry-title", "breaking_content", "pie", "tract", "caption", "tweet", "expert", "previous", "next",
-                   "compartir", "rightbar", "mas", "copyright", "instagram-media", "cookie", "paywall", "mainlist", "sitelist"]
 
-    for tag in soup.find_all("div"):
+def scrape_html(html_source, encoding=None):
+    """Tries to scrape the article from the given HTML source.
 
-        try:
-            tag_id = tag["id"].lower()
+    Parameters
+    ----------
+    html_source : bytes
+        The html source of the article.
 
-            for item in noisy_names:
-                if item in tag_id:
-                    tag.extract()
-        except:
-            pass
+    encoding : str, optional
+        The encoding of the html source. If it is missing or unknown lxml will
+        read it from the document's declaration.
+
+    Returns
+    -------
+    tuple
+        The article title, date and body.
 
-    for tag in soup.find_all(["div", "p", "blockquote"]):
+    """
 
-        try:
-            tag_class = "".join(tag["class"]).lower()
+    # We create an lxml tree from the raw bytes and remove the unnecessary tags.
+    tree = lxml.html.fromstring(html_source, parser=get_parser(encoding))
 
-            for item in noisy_names:
-                if item in tag_class:
-                    tag.extract()
-        except:
-            pass
+    # Very often the text between tags comes together, we add an artificial newline after each common tag.
+    # This is done before removing the noise, drop_tree() keeps these newlines in place of the removed tags.
+    for tag in tree.iter("p", "blockquote", "div", "h3", "br"):
+        tag.tail = "\n" + (tag.tail or "")
 
-    # These names commonly hold the article text.
-    common_names = ["artic", "summary", "cont", "note", "cuerpo", "body"]
+    # Then we extract the title and the article tags.
+    article_title = (tree.findtext(".//title") or "").replace("\n", " ").strip()
 
-    article_body = ""
+    # If our title is missing or too short we fallback to the first h1 tag.
+    if len(article_title) <= 5:
+        article_title = tree.find(".//h1").text_content().replace("\n", " ").strip()
 
-    # Sometimes we have more than one article tag. We are going to grab the longest one.
-    for article_tag in soup.find_all("article"):
+    article_date = ""
+
+    # We look for the first meta tag that has the word 'time' in it.
+    meta_dates = META_TIME_XPATH(tree)
+
+    if meta_dates:
+
+        clean_date = meta_dates[0].split("+")[0].replace("Z", "")
+
+        # Use your preferred time formatting.
+        article_date = "{:%d-%m-%Y a las %H:%M:%S}".format(
+            datetime.fromisoformat(clean_date))
+
+    # If we didn't find any meta tag with a datetime we look for a 'time' tag.
+    if len(article_date) <= 5:
+        time_tag = tree.find(".//time")
 
-        if len(article_tag.text) >= len(article_body):
-            article_body = article_tag.text
+        if time_tag is not None:
+            article_date = time_tag.text_content().strip()
+
+    # We remove the tags that add noise, including those with noisy ids or class names.
+    # drop_tree() keeps the text that follows the tag.
+    for tag in NOISY_XPATH(tree):
+        tag.drop_tree()
+
+    # Sometimes we have more than one article tag. We are going to grab the longest one.
+    # The texts are generated one at a time, so only the longest one so far is kept in memory.
+    article_body = max((article_tag.text_content() for article_tag in tree.iter("article")),
+                       key=len, default="")
 
     # The article is too short, let's try to find it in another tag.
     if len(article_body) <= ARTICLE_MINIMUM_LENGTH:
 
-        for tag in soup.find_all(["div", "section"]):
+        for tag in COMMON_ID_XPATH(tree):
+
+            tag_text = tag.text_content()
 
-            try:
-                tag_id = tag["id"].lower()
+            # We guarantee to get the longest div.
+            if len(tag_text) >= len(article_body):
+                article_body = tag_text
 
-                for item in common_names:
-                    if item in tag_id:
-                        # We guarantee to get the longest div.
-                        if len(tag.text) >= len(article_body):
-                            article_body = tag.text
-            except:
-                pass
+                # This one is long enough, we don't need to check the remaining tags.
+                if len(article_body) > ARTICLE_MINIMUM_LENGTH * 2:
+                    break
 
     # The article is still too short, let's try one more time.
     if len(article_body) <= ARTICLE_MINIMUM_LENGTH:
 
-        for tag in soup.find_all(["div", "section"]):
+        for tag in COMMON_CLASS_XPATH(tree):
+
+            tag_text = tag.text_content()
 
-            try:
-                tag_class = "".join(tag["class"]).lower()
+            # We guarantee to get the longest div.
+            if len(tag_text) >= len(article_body):
+                article_body = tag_text
 
-                for item in common_names:
-                    if item in tag_class:
-                        # We guarantee to get the longest div.
-                        if len(tag.text) >= len(article_body):
-                            article_body = tag.text
-            except:
-                pass
+                # This one is long enough, we don't need to check the remaining tags.
+                if len(article_body) > ARTICLE_MINIMUM_LENGTH * 2:
+                    break
 
     return article_title, article_date, article_body
@@ -4,7 +4,11 @@ This script extracts and ranks the sentences and words of an article.
 IT is inspired by the tf-idf algorithm.
 """
 
+import heapq
+import re
 from collections import Counter
+from functools import lru_cache
+from pathlib import Path
 
 import spacy
 
@@ -27,6 +31,9 @@ FINANCIAL_SENTENCE_MULTIPLIER = 1.5
 # The minimum number of characters needed for a line to be valid.
 LINE_LENGTH_THRESHOLD = 150
 
+# The number of articles spaCy processes at the same time.
+BATCH_SIZE = 64
+
 # It is very important to add spaces on these words.
 # Otherwise it will take into account partial words.
 COMMON_WORDS = {
@@ -39,31 +46,51 @@ COMMON_WORDS = {
 FINANCIAL_WORDS = ["$", "€", "£", "pesos", "dólar", "libras", "euros",
                    "dollar", "pound", "mdp", "mdd"]
 
+# All the financial words in a single regex, so each sentence is scanned only once.
+FINANCIAL_WORDS_REGEX = re.compile("|".join([re.escape(word) for word in FINANCIAL_WORDS]))
+
 
 # Don't forget to specify the correct model for your language.
-NLP = spacy.load("es_core_news_sm")
+# We only need the tokens and sentences. The trained components are not loaded and
+# the sentences are split with the rule based sentencizer instead of the parser.
+NLP = spacy.load("es_core_news_sm", exclude=["tok2vec", "morphologizer", "parser", "senter",
+                                             "attribute_ruler", "lemmatizer", "ner"])
+NLP.add_pipe("sentencizer")
 
 
-def add_extra_words():
-    """Adds the title and uppercase forms of all words to COMMON_WORDS.
+@lru_cache(maxsize=1)
+def load_stop_words():
+    """Reads the stop words files, they are only read from disk once.
 
     We parse local copies of stop words downloaded from the following repositories:
 
     https://github.com/stopwords-iso/stopwords-es
     https://github.com/stopwords-iso/stopwords-en
+
+    Returns
+    -------
+    frozenset
+        The Spanish and English stop words.
+
     """
 
-    with open(ES_STOPWORDS_FILE, "r", encoding="utf-8") as temp_file:
-        for word in temp_file.read().splitlines():
-            COMMON_WORDS.add(word)
+    es_words = Path(ES_STOPWORDS_FILE).read_text(encoding="utf-8").splitlines()
+    en_words = Path(EN_STOPWORDS_FILE).read_text(encoding="utf-8").splitlines()
+
+    return frozenset(es_words) | frozenset(en_words)
+
 
-    with open(EN_STOPWORDS_FILE, "r", encoding="utf-8") as temp_file:
-        for word in temp_file.read().splitlines():
-            COMMON_WORDS.add(word)
+def add_extra_words():
+    """Adds the Spanish and English stop words to COMMON_WORDS."""
+
+    COMMON_WORDS.update(load_stop_words())
 
 
 add_extra_words()
 
+# The hashes of the common words, token.lower is compared against them without creating a new string.
+COMMON_WORDS_HASHES = frozenset([NLP.vocab.strings.add(word) for word in COMMON_WORDS])
+
 
 def get_summary(article):
     """Generates the top words and sentences from the article text.
@@ -80,30 +107,70 @@ def get_summary(article):
 
     """
 
-    # Now we prepare the article for scoring.
-    cleaned_article = clean_article(article)
+    return summarize_doc(*next(tokenize_articles([article])))
+
+
+def tokenize_articles(articles):
+    """Cleans the articles and runs them through the NLP pipeline.
+
+    spaCy processes the articles in batches, which is faster than one at a time.
+
+    Parameters
+    ----------
+    articles : list
+        A list of article texts.
+
+    Yields
+    ------
+    tuple
+        The cleaned article and its spaCy document, in the same order as the articles.
+
+    """
+
+    # Now we prepare the articles for scoring.
+    cleaned_articles = [clean_article(article) for article in articles]
 
     # We start the NLP process.
-    doc = NLP(cleaned_article)
+    yield from zip(cleaned_articles, NLP.pipe(cleaned_articles, batch_size=BATCH_SIZE))
+
+
+def summarize_doc(cleaned_article, doc):
+    """Scores the words and sentences of an already processed article.
+
+    Parameters
+    ----------
+    cleaned_article : str
+        The article after it has been cleaned and reformatted.
+
+    doc : spacy.tokens.Doc
+        The spaCy document of the cleaned article.
+
+    Returns
+    -------
+    dict
+        A dict containing the title of the article, reduction percentage, top words and the top scored sentences.
+
+    """
 
     article_sentences = [sent for sent in doc.sents]
 
     words_of_interest = [
-        token.text for token in doc if token.lower_ not in COMMON_WORDS]
+        token.text for token in doc if token.lower not in COMMON_WORDS_HASHES]
 
     # We use the Counter class to count all words ocurrences.
     scored_words = Counter(words_of_interest)
 
     for word in scored_words:
 
-        # We add bonus points to words starting in uppercase and are equal or longer than 4 characters.
-        if word[0].isupper() and len(word) >= 4:
-            scored_words[word] *= IMPORTANT_WORDS_MULTIPLIER
-
         # If the word is a number we punish it by settings its points to 0.
         if word.isdigit():
             scored_words[word] = 0
 
+        # We add bonus points to words starting in uppercase and are equal or longer than 4 characters.
+        # A number never starts in uppercase, so only one of both checks is needed.
+        elif word[0].isupper() and len(word) >= 4:
+            scored_words[word] *= IMPORTANT_WORDS_MULTIPLIER
+
     top_sentences = get_top_sentences(article_sentences, scored_words)
     top_sentences_length = sum([len(sentence) for sentence in top_sentences])
     reduction = 100 - (top_sentences_length / len(cleaned_article)) * 100
@@ -133,20 +200,11 @@ def clean_article(article_text):
 
     """
 
-    # We divide the script into lines, this is to remove unnecessary whitespaces.
-    lines_list = list()
-
-    for line in article_text.split("\n"):
-
-        # We remove whitespaces.
-        stripped_line = line.strip()
+    # We divide the script into lines and remove their whitespaces.
+    stripped_lines = (line.strip() for line in article_text.split("\n"))
 
-        # If the line is too short we ignore it.
-        if len(stripped_line) >= LINE_LENGTH_THRESHOLD:
-            lines_list.append(stripped_line)
-
-    # Now we have the article fully cleaned.
-    return "   ".join(lines_list)
+    # If the line is too short we ignore it. Now we have the article fully cleaned.
+    return "   ".join([line for line in stripped_lines if len(line) >= LINE_LENGTH_THRESHOLD])
 
 
 def get_top_words(scored_words):
@@ -167,22 +225,51 @@ def get_top_words(scored_words):
     # Once we have our words scored it's time to get top ones.
     top_words = list()
 
-    for word, score in scored_words.most_common():
+    # The uppercase form of each top word, so we only compute it once.
+    seen_words = set()
+
+    for word, score in get_word_candidates(scored_words):
 
-        add_to_list = True
+        # We already have all the words we need.
+        if len(top_words) >= NUMBER_OF_TOP_WORDS:
+            break
+
+        word_upper = word.upper()
 
         # We avoid duplicates by checking if the word already is in the top_words list.
-        if word.upper() not in [item.upper() for item in top_words]:
+        if word_upper not in seen_words:
 
             # Sometimes we have the same word but in plural form, we skip the word when that happens.
-            for item in top_words:
-                if word.upper() in item.upper() or item.upper() in word.upper():
-                    add_to_list = False
-
-            if add_to_list:
+            if not any([word_upper in item or item in word_upper for item in seen_words]):
                 top_words.append(word)
+                seen_words.add(word_upper)
 
-    return top_words[0:NUMBER_OF_TOP_WORDS]
+    return top_words
+
+
+def get_word_candidates(scored_words):
+    """Yields the article words from the highest to the lowest score.
+
+    Parameters
+    ----------
+    scored_words : collections.Counter
+        A Counter containing the article words and their scores.
+
+    Yields
+    ------
+    tuple
+        The word and its score.
+
+    """
+
+    # We usually only need a few candidates, most_common() uses a heap instead of sorting all the words.
+    candidates = scored_words.most_common(NUMBER_OF_TOP_WORDS * 8)
+
+    yield from candidates
+
+    # Most of them were duplicates, we continue with the remaining words in the same order.
+    if len(candidates) < len(scored_words):
+        yield from scored_words.most_common()[len(candidates):]
 
 
 def get_top_sentences(article_sentences, scored_words):
@@ -205,29 +292,32 @@ def get_top_sentences(article_sentences, scored_words):
 
     # Now its time to score each sentence.
     scored_sentences = list()
+    seen_sentences = set()
 
     # We take a reference of the order of the sentences, this will be used later.
     for index, sent in enumerate(article_sentences):
 
+        # Span.text builds a new string on every access, we only do it once.
+        sent_text = sent.text
+
         # In some edge cases we have duplicated sentences, we make sure that doesn't happen.
-        if sent.text not in [sent for score, index, sent in scored_sentences]:
-            scored_sentences.append(
-                [score_line(sent, scored_words), index, sent.text])
+        if sent_text in seen_sentences:
+            continue
 
-    top_sentences = list()
-    counter = 0
+        seen_sentences.add(sent_text)
+        scored_sentences.append(
+            [score_line(sent, scored_words), index, sent_text])
 
-    for score, index, sentence in sorted(scored_sentences, reverse=True):
+    # When the article is too small the sentences may come empty.
+    valid_sentences = [item for item in scored_sentences if len(item[2]) >= 3]
 
-        if counter >= NUMBER_OF_SENTENCES:
-            break
+    # We only need the top ones, a heap is cheaper than sorting all of them.
+    top_sentences = list()
 
-        # When the article is too small the sentences may come empty.
-        if len(sentence) >= 3:
+    for score, index, sentence in heapq.nlargest(NUMBER_OF_SENTENCES, valid_sentences):
 
-            # We clean the sentence and its index so we can sort in chronological order.
-            top_sentences.append([index, sentence])
-            counter += 1
+        # We clean the sentence and its index so we can sort in chronological order.
+        top_sentences.append([index, sentence])
 
     return [sentence for index, sentence in sorted(top_sentences)]
 
@@ -250,22 +340,12 @@ def score_line(line, scored_words):
 
     """
 
-    # We remove the common words.
-    cleaned_line = [
-        token.text for token in line if token.lower_ not in COMMON_WORDS]
-
-    # We now sum the total number of ocurrences for all words.
-    temp_score = 0
-
-    for word in cleaned_line:
-        temp_score += scored_words[word]
+    # We sum the total number of ocurrences for all words, skipping the common ones.
+    temp_score = sum([scored_words[token.text]
+                      for token in line if token.lower not in COMMON_WORDS_HASHES])
 
     # We apply a bonus score to sentences that contain financial information.
-    line_lowercase = line.text.lower()
-
-    for word in FINANCIAL_WORDS:
-        if word in line_lowercase:
-            temp_score *= FINANCIAL_SENTENCE_MULTIPLIER
-            break
+    if FINANCIAL_WORDS_REGEX.search(line.text.lower()):
+        temp_score *= FINANCIAL_SENTENCE_MULTIPLIER
 
     return temp_score